@@ -2,7 +2,8 @@
 
 from setuptools import find_packages, setup
 
-inst_reqs = ["titiler==0.2.0", "mangum>=0.10"]
+inst_reqs = ["titiler==0.2.0", "mangum>=0.10", "packaging"]
+extra_reqs = {"test": ["pytest", "pytest-cov"]}
 
 
 setup(
@@ -27,4 +28,5 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=inst_reqs,
+    extras_require=extra_reqs,
 )
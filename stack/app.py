@@ -40,6 +40,7 @@ class titilerLambdaStack(core.Stack):
         permissions: Optional[List[iam.PolicyStatement]] = None,
         env: dict = {},
         code_dir: str = "./",
+        build_args: Optional[dict] = None,
         **kwargs: Any,
     ) -> None:
         """Define stack."""
@@ -55,7 +56,9 @@ class titilerLambdaStack(core.Stack):
                 path=os.path.abspath(code_dir),
                 bundling=core.BundlingOptions(
                     image=core.BundlingDockerImage.from_asset(
-                        os.path.abspath(code_dir), file="Dockerfile",
+                        os.path.abspath(code_dir),
+                        file="Dockerfile",
+                        build_args=build_args,
                     ),
                     command=["bash", "-c", "cp -R /var/task/. /asset-output/."],
                 ),
@@ -111,6 +114,7 @@ titilerLambdaStack(
     concurrent=settings.max_concurrent,
     permissions=perms,
     env=settings.additional_env,
+    build_args={"RASTERIO_VERSION": settings.rasterio_version},
 )
 
 app.synth()
@@ -18,6 +18,10 @@ class StackSettings(pydantic.BaseSettings):
         "MAX_THREADS": "1",
     }
 
+    # rasterio version installed in the lambda package
+    # The application block cache (BLOCK_CACHE_MAXSIZE) requires rasterio>=1.3
+    rasterio_version: str = "1.1.8"
+
     # add S3 bucket where TiTiler could do HEAD and GET Requests
     buckets: List = ["sentinel-s2-l2a-mosaic-120"]
 
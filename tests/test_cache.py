@@ -0,0 +1,265 @@
+"""test titiler_digitaltwin.cache."""
+
+import os
+import time
+
+import numpy
+import pytest
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.errors import RasterioIOError
+from rasterio.transform import from_bounds
+from rio_tiler.io import COGReader
+
+from titiler_digitaltwin.cache import (
+    BlockCache,
+    BlockCacheFile,
+    CachedTile,
+    FileFetcher,
+    TileCache,
+    default_fetchers,
+    rasterio_streams_fileobj,
+)
+from titiler_digitaltwin.reader import CachedCOGReader
+
+URL = "s3://bucket/file.bin"
+
+
+@pytest.fixture
+def fake_s3(tmp_path):
+    """Local directory standing in for S3, with a 1000 bytes file."""
+    os.makedirs(tmp_path / "bucket")
+    content = os.urandom(1000)
+    (tmp_path / "bucket" / "file.bin").write_bytes(content)
+    return tmp_path, content
+
+
+def test_read(fake_s3):
+    """Should read across block boundaries."""
+    root, content = fake_s3
+    cache = BlockCache(
+        maxsize=1000, blocksize=100, fetchers={"s3": FileFetcher(root=str(root))}
+    )
+    assert cache.size(URL) == 1000
+    assert cache.read(URL, 0, 10) == content[:10]
+    assert cache.read(URL, 150, 300) == content[150:450]
+    assert cache.read(URL, 950, 300) == content[950:]
+    assert cache.read(URL, 1000, 10) == b""
+
+    with BlockCacheFile(URL, cache) as f:
+        f.seek(-10, os.SEEK_END)
+        assert f.read() == content[-10:]
+        f.seek(5)
+        assert f.read(20) == content[5:25]
+
+    with pytest.raises(RasterioIOError):
+        cache.read("s3://bucket/missing.bin", 0, 10)
+
+
+def test_missing_file(fake_s3):
+    """Should remember missing files for `missing_ttl` seconds."""
+    root, content = fake_s3
+    url = "s3://bucket/new.bin"
+
+    cache = BlockCache(blocksize=100, fetchers={"s3": FileFetcher(root=str(root))})
+    with pytest.raises(RasterioIOError):
+        cache.size(url)
+
+    (root / "bucket" / "new.bin").write_bytes(content)
+    with pytest.raises(RasterioIOError):
+        cache.size(url)
+
+    cache = BlockCache(
+        blocksize=100, missing_ttl=0, fetchers={"s3": FileFetcher(root=str(root))}
+    )
+    os.remove(root / "bucket" / "new.bin")
+    with pytest.raises(RasterioIOError):
+        cache.size(url)
+
+    (root / "bucket" / "new.bin").write_bytes(content)
+    assert cache.size(url) == 1000
+    assert cache.read(url, 0, 10) == content[:10]
+
+
+def test_read_merge_ranges(fake_s3):
+    """Should fetch consecutive missing blocks with one request."""
+    root, content = fake_s3
+
+    calls = []
+
+    class CountingFetcher(FileFetcher):
+        def read(self, url, offset, length):
+            calls.append((offset, length))
+            return super().read(url, offset, length)
+
+    cache = BlockCache(
+        maxsize=1000, blocksize=100, fetchers={"s3": CountingFetcher(root=str(root))}
+    )
+    assert cache.read(URL, 250, 100) == content[250:350]
+    assert calls == [(200, 200)]
+
+    calls.clear()
+    assert cache.read(URL, 0, 1000) == content
+    assert calls == [(0, 200), (400, 600)]
+    assert cache.misses == 10
+
+
+def test_lru(fake_s3):
+    """Should evict least recently used blocks."""
+    root, content = fake_s3
+    cache = BlockCache(
+        maxsize=300, blocksize=100, fetchers={"s3": FileFetcher(root=str(root))}
+    )
+    assert cache.read(URL, 0, 1000) == content
+    stats = cache.stats()
+    assert stats["blocks"] == 3
+    assert stats["bytes"] <= 300
+
+    # most recent blocks are kept
+    cache.read(URL, 700, 300)
+    assert cache.hits == 3
+    assert cache.misses == 10
+
+
+def test_spill(fake_s3, tmp_path_factory):
+    """Should write evicted blocks to the spill directory."""
+    root, content = fake_s3
+    spill_dir = tmp_path_factory.mktemp("spill")
+    process_dir = spill_dir / str(os.getpid())
+
+    # files left by a previous process with the same pid are removed,
+    # other processes directories are kept
+    os.makedirs(process_dir)
+    (process_dir / "orphan.block").write_bytes(b"0" * 100)
+    os.makedirs(spill_dir / "1")
+    (spill_dir / "1" / "other.block").write_bytes(b"0" * 100)
+
+    cache = BlockCache(
+        maxsize=200,
+        blocksize=100,
+        spill_dir=str(spill_dir),
+        spill_maxsize=300,
+        fetchers={"s3": FileFetcher(root=str(root))},
+    )
+    assert not os.listdir(process_dir)
+    assert os.listdir(spill_dir / "1") == ["other.block"]
+    spill_dir = process_dir
+
+    # blocks 0-2 are spilled, 3-4 are in memory
+    assert cache.read(URL, 0, 500) == content[:500]
+    assert len(list(spill_dir.glob("*.block"))) == 3
+    assert cache.stats()["spill_bytes"] == 300
+
+    assert cache.read(URL, 0, 100) == content[:100]
+    assert cache.spill_hits == 1
+
+    # blocks 5-9 evict 1-2 (and others) from the spill directory
+    assert cache.read(URL, 500, 500) == content[500:]
+    assert cache.stats()["spill_bytes"] <= 300
+    assert len(list(spill_dir.glob("*.block"))) == cache.stats()["spill_blocks"]
+
+    # truncated blocks are ignored
+    key = next(iter(cache._spilled._data))
+    with open(cache._spill_path(key), "wb") as f:
+        f.write(b"0" * 10)
+    assert cache._read_spill(key) is None
+    assert key not in cache._spilled
+
+    cache.clear()
+    assert not list(spill_dir.glob("*.block"))
+
+
+def test_stats(fake_s3):
+    """Should report hit ratio."""
+    root, _ = fake_s3
+    cache = BlockCache(
+        maxsize=1000, blocksize=100, fetchers={"s3": FileFetcher(root=str(root))}
+    )
+    assert cache.stats()["hit_ratio"] is None
+
+    cache.read(URL, 0, 200)
+    cache.read(URL, 0, 200)
+    cache.read(URL, 100, 200)
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 3
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_tile_cache():
+    """Should expire tiles after `ttl` seconds."""
+    evicted = []
+    cache = TileCache(100, ttl=60, on_evict=lambda k, v: evicted.append(k))
+    cache.set("a", CachedTile(b"0" * 10, "image/png"))
+    assert "a" in cache
+    assert cache.get("a").content == b"0" * 10
+    assert cache.currsize == 10
+
+    cache.set("b", CachedTile(b"0" * 10, "image/png", created=time.monotonic() - 61))
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert evicted == ["b"]
+    assert cache.currsize == 10
+
+
+@pytest.fixture
+def cog(tmp_path):
+    """Tiled GeoTIFF with overviews in a local stand-in for S3."""
+    os.makedirs(tmp_path / "bucket")
+    path = str(tmp_path / "bucket" / "cog.tif")
+
+    arr = numpy.random.randint(1, 10000, (1, 1024, 1024), dtype="uint16")
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        dtype="uint16",
+        count=1,
+        width=1024,
+        height=1024,
+        crs="epsg:4326",
+        transform=from_bounds(0, 0, 1, 1, 1024, 1024),
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress="deflate",
+    ) as dst:
+        dst.write(arr)
+        dst.build_overviews([2, 4], Resampling.nearest)
+
+    return tmp_path, path, arr
+
+
+@pytest.mark.skipif(not rasterio_streams_fileobj, reason="requires rasterio>=1.3")
+def test_open_dataset(cog):
+    """Should only read the needed blocks."""
+    root, path, arr = cog
+    cache = BlockCache(blocksize=16384, fetchers=default_fetchers(str(root)))
+    with cache.open_dataset("s3://bucket/cog.tif") as src:
+        data = src.read(window=((0, 256), (256, 512)))
+
+    numpy.testing.assert_array_equal(data, arr[:, 0:256, 256:512])
+    assert cache.misses * cache.blocksize < os.path.getsize(path) / 2
+
+    with pytest.raises(RasterioIOError):
+        cache.open_dataset("s3://bucket/missing.tif")
+
+
+@pytest.mark.skipif(not rasterio_streams_fileobj, reason="requires rasterio>=1.3")
+def test_cached_cog_reader(cog):
+    """Should read the same data as COGReader."""
+    root, path, _ = cog
+    cache = BlockCache(blocksize=16384, fetchers=default_fetchers(str(root)))
+    with COGReader(path) as cogeo:
+        expected = cogeo.preview(max_size=128)
+
+    with CachedCOGReader("s3://bucket/cog.tif", cache=cache) as cogeo:
+        assert cogeo.bounds == pytest.approx((0, 0, 1, 1))
+        img = cogeo.preview(max_size=128)
+
+    numpy.testing.assert_array_equal(img.data, expected.data)
+    assert cache.misses
+    assert cache.stats()["hit_ratio"] is not None
+
+    with pytest.raises(RasterioIOError):
+        CachedCOGReader("s3://bucket/missing.tif", cache=cache)
@@ -0,0 +1,91 @@
+"""test titiler_digitaltwin.mosaic."""
+
+import attr
+import numpy
+from rio_tiler.constants import WEB_MERCATOR_TMS
+from rio_tiler.models import ImageData
+
+from titiler_digitaltwin import mosaic
+from titiler_digitaltwin.cache import TileCache, TileKey
+from titiler_digitaltwin.prefetch import Prefetcher
+
+from fastapi import FastAPI
+
+from starlette.testclient import TestClient
+
+calls = []
+
+
+@attr.s
+class FakeBackend:
+    """Mosaic backend recording rendered tiles."""
+
+    reader = attr.ib(default=None)
+    reader_options: dict = attr.ib(factory=dict)
+    minzoom: int = attr.ib(default=5)
+    maxzoom: int = attr.ib(default=10)
+    tms = attr.ib(default=WEB_MERCATOR_TMS)
+
+    def __enter__(self):
+        """Support using with Context Managers."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Support using with Context Managers."""
+        pass
+
+    def assets_for_tile(self, x, y, z):
+        """Retrieve assets for tile."""
+        return ["31TCJ"]
+
+    def tile(self, x, y, z, tilesize=256, **kwargs):
+        """Create a tile."""
+        calls.append((x, y, z))
+        data = numpy.zeros((1, tilesize, tilesize), dtype="uint8")
+        mask = numpy.full((tilesize, tilesize), 255, dtype="uint8")
+        return ImageData(data, mask), ["31TCJ"]
+
+
+def test_tile_cache_prefetch(monkeypatch):
+    """Should serve tiles from the cache and prefetch neighbours."""
+    tile_cache = TileCache(2 ** 20, ttl=60)
+    prefetcher = Prefetcher(tile_cache, queue_size=8)
+    monkeypatch.setattr(mosaic, "tile_cache", tile_cache)
+    monkeypatch.setattr(mosaic, "prefetcher", prefetcher)
+    monkeypatch.setattr(mosaic.prefetch_settings, "max_tiles", 4)
+
+    app = FastAPI()
+    app.include_router(mosaic.MosaicTilerFactory(reader=FakeBackend).router)
+    client = TestClient(app)
+
+    calls.clear()
+    response = client.get("/tiles/6/10/10.png?year=2019&month=1&day=1")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+    # neighbours are queued once the response is sent
+    prefetcher._queue.join()
+    assert prefetcher.scheduled == 4
+    assert sorted(calls) == [
+        (9, 10, 6),
+        (10, 9, 6),
+        (10, 10, 6),
+        (10, 11, 6),
+        (11, 10, 6),
+    ]
+
+    query = (("day", "1"), ("month", "1"), ("year", "2019"))
+    key = TileKey("WebMercatorQuad", 11, 10, 6, 1, "png", query)
+    assert key in tile_cache
+    assert tile_cache.get(key).prefetched
+
+    # same request is served from the cache
+    calls.clear()
+    cached = client.get("/tiles/6/10/10.png?year=2019&month=1&day=1")
+    assert cached.content == response.content
+    assert (10, 10, 6) not in calls
+
+    # prefetched tile
+    client.get("/tiles/6/11/10.png?year=2019&month=1&day=1")
+    assert (11, 10, 6) not in calls
+    assert prefetcher.hits == 1
@@ -0,0 +1,142 @@
+"""test titiler_digitaltwin.prefetch."""
+
+import threading
+
+import attr
+from rio_tiler.constants import WEB_MERCATOR_TMS
+
+from titiler_digitaltwin.cache import CachedTile, LRUCache
+from titiler_digitaltwin.prefetch import Prefetcher, likely_tiles
+
+
+@attr.s
+class FakeBackend:
+    """Mosaic backend with every tile intersecting the grid except `empty`."""
+
+    minzoom: int = attr.ib(default=5)
+    maxzoom: int = attr.ib(default=10)
+    tms = attr.ib(default=WEB_MERCATOR_TMS)
+    empty: list = attr.ib(factory=list)
+
+    def assets_for_tile(self, x, y, z):
+        """Retrieve assets for tile."""
+        return [] if (x, y, z) in self.empty else ["31TCJ"]
+
+
+def test_likely_tiles():
+    """Should return neighbours then children."""
+    assert likely_tiles(FakeBackend(), 10, 10, 6, max_tiles=12) == [
+        (10, 9, 6),
+        (11, 10, 6),
+        (10, 11, 6),
+        (9, 10, 6),
+        (20, 20, 7),
+        (21, 20, 7),
+        (20, 21, 7),
+        (21, 21, 7),
+        (9, 9, 6),
+        (11, 9, 6),
+        (11, 11, 6),
+        (9, 11, 6),
+    ]
+
+    # max_tiles
+    assert likely_tiles(FakeBackend(), 10, 10, 6, max_tiles=3) == [
+        (10, 9, 6),
+        (11, 10, 6),
+        (10, 11, 6),
+    ]
+
+    # matrix edges
+    assert likely_tiles(FakeBackend(), 0, 0, 5, max_tiles=12) == [
+        (1, 0, 5),
+        (0, 1, 5),
+        (0, 0, 6),
+        (1, 0, 6),
+        (0, 1, 6),
+        (1, 1, 6),
+        (1, 1, 5),
+    ]
+    assert likely_tiles(FakeBackend(), 31, 31, 5, max_tiles=12) == [
+        (31, 30, 5),
+        (30, 31, 5),
+        (62, 62, 6),
+        (63, 62, 6),
+        (62, 63, 6),
+        (63, 63, 6),
+        (30, 30, 5),
+    ]
+
+    # no children at maxzoom
+    assert likely_tiles(FakeBackend(), 10, 10, 10, max_tiles=12) == [
+        (10, 9, 10),
+        (11, 10, 10),
+        (10, 11, 10),
+        (9, 10, 10),
+        (9, 9, 10),
+        (11, 9, 10),
+        (11, 11, 10),
+        (9, 11, 10),
+    ]
+
+    # no tiles above maxzoom
+    assert likely_tiles(FakeBackend(), 10, 10, 12, max_tiles=12) == []
+
+    # tiles not intersecting the grid
+    backend = FakeBackend(empty=[(10, 9, 6), (20, 20, 7)])
+    assert likely_tiles(backend, 10, 10, 6, max_tiles=4) == [
+        (11, 10, 6),
+        (10, 11, 6),
+        (9, 10, 6),
+        (21, 20, 7),
+    ]
+
+
+def test_prefetcher():
+    """Should render scheduled tiles in the background."""
+    cache = LRUCache(100, sizeof=lambda t: len(t.content))
+    prefetcher = Prefetcher(cache, max_bytes=25)
+
+    rendered = threading.Event()
+
+    def render():
+        rendered.set()
+        return b"0" * 10, "image/png"
+
+    # workers wait for foreground requests
+    with prefetcher.foreground():
+        prefetcher.schedule("a", render)
+        assert not rendered.wait(0.1)
+    prefetcher._queue.join()
+    assert cache.get("a").prefetched
+    assert prefetcher.prefetched_bytes == 10
+
+    # cached tiles are not scheduled again
+    prefetcher.schedule("a", render)
+    assert prefetcher.scheduled == 1
+
+    # max_bytes
+    prefetcher.schedule("b", render)
+    prefetcher.schedule("c", render)
+    prefetcher._queue.join()
+    assert "b" in cache
+    assert "c" not in cache
+    assert prefetcher.dropped == 1
+    assert prefetcher.prefetched_bytes == 20
+
+    # hits are counted once
+    tile = cache.get("a")
+    prefetcher.consume(tile)
+    prefetcher.consume(tile)
+    assert prefetcher.hits == 1
+    assert prefetcher.prefetched_bytes == 10
+    assert prefetcher.stats()["hit_rate"] == 0.5
+
+    # requested tiles are not counted
+    prefetcher.consume(CachedTile(b"0" * 10, "image/png"))
+    assert prefetcher.hits == 1
+
+    # evicted tiles release the budget
+    cache.set("d", CachedTile(b"0" * 95, "image/png"))
+    assert "b" not in cache
+    assert prefetcher.prefetched_bytes == 0
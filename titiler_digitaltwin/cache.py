@@ -0,0 +1,543 @@
+"""titiler-digitaltwin caches."""
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import attr
+import rasterio
+from packaging.version import Version
+from rasterio.errors import RasterioIOError
+
+from titiler_digitaltwin.settings import CacheSettings
+
+logger = logging.getLogger(__name__)
+
+cache_settings = CacheSettings()
+
+# Streaming reads through python file objects needs `rasterio.io.FilePath`
+# (rasterio>=1.3) or `rasterio.open(..., opener=)` (rasterio>=1.4), otherwise
+# rasterio reads them in full in a MemoryFile.
+rasterio_version = Version(rasterio.__version__)
+rasterio_streams_fileobj = rasterio_version >= Version("1.3")
+
+
+@attr.s
+class LRUCache:
+    """Thread-safe LRU mapping bounded by the total size of its values."""
+
+    maxsize: int = attr.ib()
+    sizeof: Callable[[Any], int] = attr.ib(default=len)
+    on_evict: Optional[Callable[[Hashable, Any], None]] = attr.ib(default=None)
+
+    currsize: int = attr.ib(init=False, default=0)
+    _data: OrderedDict = attr.ib(init=False, factory=OrderedDict)
+    _lock: threading.RLock = attr.ib(init=False, factory=threading.RLock)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check key presence without updating recency."""
+        return key in self._data
+
+    def __len__(self) -> int:
+        """Number of items in the cache."""
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get value and mark it as most recently used."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        """Add value and evict least recently used items to stay within maxsize.
+
+        A value replaced for the same key is also passed to `on_evict`.
+
+        """
+        size = self.sizeof(value)
+        if size > self.maxsize:
+            return
+
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                old = self._data.pop(key)
+                self.currsize -= self.sizeof(old)
+                if old is not value:
+                    evicted.append((key, old))
+            self._data[key] = value
+            self.currsize += size
+            while self.currsize > self.maxsize:
+                k, v = self._data.popitem(last=False)
+                self.currsize -= self.sizeof(v)
+                evicted.append((k, v))
+
+        if self.on_evict:
+            for k, v in evicted:
+                self.on_evict(k, v)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove value from the cache."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self.currsize -= self.sizeof(value)
+            return value
+
+    def clear(self):
+        """Remove all values (without calling `on_evict`)."""
+        with self._lock:
+            self._data.clear()
+            self.currsize = 0
+
+
+@attr.s
+class FileFetcher:
+    """Fetch byte ranges from local files.
+
+    When `root` is set, `{scheme}://{bucket}/{key}` urls are mapped to
+    `{root}/{bucket}/{key}` so a local directory can stand in for S3.
+
+    """
+
+    root: Optional[str] = attr.ib(default=None)
+
+    def _path(self, url: str) -> str:
+        parsed = urlparse(url)
+        if self.root:
+            return os.path.join(self.root, parsed.netloc, parsed.path.lstrip("/"))
+        return parsed.path if parsed.scheme == "file" else url
+
+    def size(self, url: str) -> int:
+        """Get file size."""
+        try:
+            return os.path.getsize(self._path(url))
+        except OSError as e:
+            raise RasterioIOError(f"{url}: {e}") from e
+
+    def read(self, url: str, offset: int, length: int) -> bytes:
+        """Read `length` bytes starting at `offset`."""
+        try:
+            with open(self._path(url), "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+        except OSError as e:
+            raise RasterioIOError(f"{url}: {e}") from e
+
+
+@attr.s
+class S3Fetcher:
+    """Fetch byte ranges from AWS S3."""
+
+    _client: Any = attr.ib(default=None)
+    _lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+
+    @property
+    def client(self):
+        """Lazily create the boto3 client (boto3's default session isn't thread-safe)."""
+        with self._lock:
+            if self._client is None:
+                import boto3
+
+                self._client = boto3.session.Session().client("s3")
+        return self._client
+
+    def _request(self, method: str, url: str, **kwargs) -> Dict:
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        parsed = urlparse(url)
+        try:
+            return getattr(self.client, method)(
+                Bucket=parsed.netloc, Key=parsed.path.lstrip("/"), **kwargs
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise RasterioIOError(f"{url}: {e}") from e
+
+    def size(self, url: str) -> int:
+        """Get object size."""
+        return self._request("head_object", url)["ContentLength"]
+
+    def read(self, url: str, offset: int, length: int) -> bytes:
+        """Read `length` bytes starting at `offset`."""
+        resp = self._request(
+            "get_object", url, Range=f"bytes={offset}-{offset + length - 1}"
+        )
+        return resp["Body"].read()
+
+
+def default_fetchers(root: Optional[str] = None) -> Dict[str, Any]:
+    """Fetchers by url scheme.
+
+    When `root` is set, `s3://` urls are read from that local directory.
+
+    """
+    s3 = FileFetcher(root=root) if root else S3Fetcher()
+    return {"s3": s3, "file": FileFetcher(), "": FileFetcher()}
+
+
+@attr.s
+class BlockCache:
+    """Byte-range cache for remote files.
+
+    Reads are split in `blocksize` aligned blocks, keyed by `(url, offset, length)`,
+    and kept in memory up to `maxsize` bytes. When `spill_dir` is set, blocks
+    evicted from memory are written in a `{spill_dir}/{pid}` directory, up to
+    `spill_maxsize` bytes. Missing files are remembered for `missing_ttl` seconds
+    (GDAL looks for sidecar files on open).
+
+    Examples:
+        >>> cache = BlockCache(fetchers={"s3": FileFetcher(root="/tmp/fake-s3")})
+        >>> cache.read("s3://bucket/cog.tif", 0, 16384)
+
+    """
+
+    maxsize: int = attr.ib(default=64 * 2 ** 20)
+    blocksize: int = attr.ib(default=2 ** 17)
+    spill_dir: Optional[str] = attr.ib(default=None)
+    spill_maxsize: int = attr.ib(default=256 * 2 ** 20)
+    fetchers: Dict[str, Any] = attr.ib(factory=default_fetchers)
+    missing_ttl: float = attr.ib(default=60.0)
+
+    hits: int = attr.ib(init=False, default=0)
+    spill_hits: int = attr.ib(init=False, default=0)
+    misses: int = attr.ib(init=False, default=0)
+
+    def __attrs_post_init__(self):
+        """Create memory and spill storages."""
+        self._sizes = LRUCache(1024, sizeof=lambda v: 1)
+        # url -> time until which the file is considered missing
+        self._missing = LRUCache(1024, sizeof=lambda v: 1)
+        self._blocks = LRUCache(self.maxsize, on_evict=self._spill)
+        self._spilled: Optional[LRUCache] = None
+        if self.spill_dir:
+            # Blocks left by a previous process with the same pid are removed,
+            # other processes sharing `spill_dir` use their own directory
+            self._spill_root = os.path.join(self.spill_dir, str(os.getpid()))
+            shutil.rmtree(self._spill_root, ignore_errors=True)
+            os.makedirs(self._spill_root)
+            self._spilled = LRUCache(
+                self.spill_maxsize,
+                sizeof=lambda v: v,
+                on_evict=lambda key, _: self._remove_spill(key),
+            )
+        self._lock = threading.Lock()
+
+    def _fetcher(self, url: str):
+        scheme = urlparse(url).scheme
+        try:
+            return self.fetchers[scheme]
+        except KeyError:
+            raise RasterioIOError(f"{url}: no fetcher for '{scheme}' urls.")
+
+    def _spill_path(self, key: Tuple[str, int, int]) -> str:
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self._spill_root, f"{name}.block")
+
+    def _spill(self, key: Tuple[str, int, int], data: bytes):
+        if self._spilled is None or key in self._spilled:
+            return
+        # Write then rename so readers never see a partial block
+        fd, tmp_path = tempfile.mkstemp(dir=self._spill_root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._spill_path(key))
+        self._spilled.set(key, len(data))
+
+    def _remove_spill(self, key: Tuple[str, int, int]):
+        try:
+            os.remove(self._spill_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _read_spill(self, key: Tuple[str, int, int]) -> Optional[bytes]:
+        if self._spilled is None or self._spilled.get(key) is None:
+            return None
+        try:
+            with open(self._spill_path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+
+        if data is None or len(data) != key[2]:
+            self._spilled.pop(key)
+            self._remove_spill(key)
+            return None
+        return data
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def size(self, url: str) -> int:
+        """Get file size."""
+        size = self._sizes.get(url)
+        if size is not None:
+            return size
+
+        missing_until = self._missing.get(url)
+        if missing_until is not None:
+            if time.monotonic() < missing_until:
+                raise RasterioIOError(f"{url}: file not found.")
+            self._missing.pop(url)
+
+        try:
+            size = self._fetcher(url).size(url)
+        except RasterioIOError:
+            if self.missing_ttl > 0:
+                self._missing.set(url, time.monotonic() + self.missing_ttl)
+            raise
+
+        self._sizes.set(url, size)
+        return size
+
+    def open(self, url: str, mode: str = "rb") -> "BlockCacheFile":
+        """Open a file object reading through the cache (usable as rasterio opener)."""
+        if mode != "rb":
+            raise ValueError(f"{mode} mode is not supported.")
+        self.size(url)
+        return BlockCacheFile(url, self)
+
+    def open_dataset(self, url: str) -> rasterio.io.DatasetReader:
+        """Open a rasterio dataset reading through the cache."""
+        if rasterio_version >= Version("1.4"):
+            return rasterio.open(url, opener=self.open)
+
+        from rasterio.io import FilePath
+
+        filepath = FilePath(self.open(url))
+        dataset = filepath.open()
+        dataset._env.enter_context(filepath)
+        return dataset
+
+    def _get_cached(self, key: Tuple[str, int, int]) -> Optional[bytes]:
+        data = self._blocks.get(key)
+        if data is not None:
+            self._count("hits")
+            return data
+
+        data = self._read_spill(key)
+        if data is not None:
+            self._count("spill_hits")
+            self._blocks.set(key, data)
+        return data
+
+    def _fetch(self, keys: List[Tuple[str, int, int]]) -> Dict[int, bytes]:
+        """Fetch consecutive blocks with one range request."""
+        url, start, _ = keys[0]
+        length = sum(key[2] for key in keys)
+        data = self._fetcher(url).read(url, start, length)
+
+        blocks = {}
+        for key in keys:
+            _, offset, length = key
+            block = data[offset - start : offset - start + length]
+            self._count("misses")
+            self._blocks.set(key, block)
+            blocks[offset] = block
+        return blocks
+
+    def read(self, url: str, offset: int, length: int) -> bytes:
+        """Read `length` bytes starting at `offset`.
+
+        Consecutive blocks missing from the cache are fetched with a single request.
+
+        """
+        size = self.size(url)
+        end = min(offset + length, size)
+        if end <= offset:
+            return b""
+
+        offsets = range(offset - offset % self.blocksize, end, self.blocksize)
+        blocks: Dict[int, bytes] = {}
+        missing: List[Tuple[str, int, int]] = []
+        for block_offset in offsets:
+            key = (url, block_offset, min(self.blocksize, size - block_offset))
+            data = self._get_cached(key)
+            if data is not None:
+                blocks[block_offset] = data
+                continue
+
+            if missing and missing[-1][1] + self.blocksize != block_offset:
+                blocks.update(self._fetch(missing))
+                missing = []
+            missing.append(key)
+
+        if missing:
+            blocks.update(self._fetch(missing))
+
+        return b"".join(blocks[o][max(offset - o, 0) : end - o] for o in offsets)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics."""
+        total = self.hits + self.spill_hits + self.misses
+        return {
+            "hits": self.hits,
+            "spill_hits": self.spill_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.spill_hits) / total if total else None,
+            "blocks": len(self._blocks),
+            "bytes": self._blocks.currsize,
+            "spill_blocks": len(self._spilled) if self._spilled is not None else 0,
+            "spill_bytes": self._spilled.currsize if self._spilled is not None else 0,
+        }
+
+    def clear(self):
+        """Remove all blocks and reset statistics."""
+        self._blocks.clear()
+        if self._spilled is not None:
+            for key in list(self._spilled._data):
+                self._remove_spill(key)
+            self._spilled.clear()
+        self._sizes.clear()
+        self._missing.clear()
+        self.hits = self.spill_hits = self.misses = 0
+
+
+class BlockCacheFile(io.RawIOBase):
+    """Read-only file object reading through a BlockCache."""
+
+    mode = "rb"
+
+    def __init__(self, url: str, cache: BlockCache):
+        """Set url and cache."""
+        self.name = url
+        self._cache = cache
+        self._pos = 0
+
+    # rasterio clones fsspec-like file objects with `fs.open(path, mode)`
+    @property
+    def fs(self) -> BlockCache:
+        """Filesystem the file was opened from."""
+        return self._cache
+
+    @property
+    def path(self) -> str:
+        """File url."""
+        return self.name
+
+    def readable(self) -> bool:
+        """File is readable."""
+        return True
+
+    def seekable(self) -> bool:
+        """File is seekable."""
+        return True
+
+    def tell(self) -> int:
+        """Current position."""
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Move to a new position."""
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._cache.size(self.name)
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, b) -> int:
+        """Read bytes into a pre-allocated buffer."""
+        data = self._cache.read(self.name, self._pos, len(b))
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        return n
+
+
+block_cache: Optional[BlockCache] = (
+    BlockCache(
+        maxsize=cache_settings.block_cache_maxsize,
+        blocksize=cache_settings.block_cache_blocksize,
+        spill_dir=cache_settings.block_cache_spill_dir,
+        spill_maxsize=cache_settings.block_cache_spill_maxsize,
+        missing_ttl=cache_settings.block_cache_missing_ttl,
+        fetchers=default_fetchers(cache_settings.block_cache_file_root),
+    )
+    if cache_settings.block_cache_maxsize and rasterio_streams_fileobj
+    else None
+)
+if cache_settings.block_cache_maxsize and not rasterio_streams_fileobj:
+    logger.warning(
+        "BLOCK_CACHE_MAXSIZE is set but the block cache requires rasterio>=1.3 "
+        "(found %s), the block cache is disabled.",
+        rasterio.__version__,
+    )
+
+
+class TileKey(NamedTuple):
+    """Tile cache key."""
+
+    tms: str
+    x: int
+    y: int
+    z: int
+    scale: int
+    format: Optional[str]
+    query_params: Tuple[Tuple[str, str], ...]
+
+
+@attr.s
+class CachedTile:
+    """Rendered tile."""
+
+    content: bytes = attr.ib()
+    media_type: str = attr.ib()
+    # Set for tiles written by the prefetcher and not yet requested
+    prefetched: bool = attr.ib(default=False)
+    created: float = attr.ib(factory=time.monotonic)
+
+
+@attr.s
+class TileCache(LRUCache):
+    """LRU cache of rendered tiles.
+
+    Tiles expire after `ttl` seconds: grid files missing when a tile was rendered
+    (allowed by the mosaic) might have been published since.
+
+    """
+
+    sizeof: Callable[[Any], int] = attr.ib(default=lambda t: len(t.content))
+    ttl: Optional[float] = attr.ib(default=None)
+
+    def _expired(self, tile: CachedTile) -> bool:
+        return self.ttl is not None and time.monotonic() - tile.created > self.ttl
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check key presence (and expiry) without updating recency."""
+        tile = self._data.get(key)
+        return tile is not None and not self._expired(tile)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get tile and mark it as most recently used, removing expired tiles."""
+        with self._lock:
+            tile = super().get(key)
+            if tile is None:
+                return default
+            if not self._expired(tile):
+                return tile
+            self.pop(key)
+
+        if self.on_evict:
+            self.on_evict(key, tile)
+        return default
+
+
+tile_cache: Optional[TileCache] = (
+    TileCache(cache_settings.tile_cache_maxsize, ttl=cache_settings.tile_cache_ttl)
+    if cache_settings.tile_cache_maxsize
+    else None
+)
@@ -11,7 +11,9 @@ from titiler.middleware import (
     TotalTimeMiddleware,
 )
 
+from titiler_digitaltwin.cache import block_cache, tile_cache
 from titiler_digitaltwin.mosaic import MosaicTilerFactory
+from titiler_digitaltwin.prefetch import prefetcher
 from titiler_digitaltwin.settings import ApiSettings
 from titiler_digitaltwin.templates import templates
 
@@ -61,3 +63,15 @@ def landing(request: Request):
         context={"request": request, "endpoint": request.url_for("landing")},
         media_type="text/html",
     )
+
+
+@app.get("/cache/stats", include_in_schema=False)
+def cache_stats():
+    """Return application caches statistics."""
+    return {
+        "block": block_cache.stats() if block_cache is not None else None,
+        "tile": {"tiles": len(tile_cache), "bytes": tile_cache.currsize}
+        if tile_cache is not None
+        else None,
+        "prefetch": prefetcher.stats() if prefetcher is not None else None,
+    }
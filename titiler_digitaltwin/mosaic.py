@@ -1,8 +1,10 @@
 """titiler-digitaltwin custom mosaic endpoint factory."""
 
 import os
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Callable, Dict, Optional, Type
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple, Type
 from urllib.parse import urlencode
 
 import rasterio
@@ -16,10 +18,13 @@ from titiler.errors import RasterioIOError, TileOutsideBounds
 from titiler.models.mapbox import TileJSON
 from titiler.resources.enums import ImageType, PixelSelectionMethod
 
+from titiler_digitaltwin.cache import CachedTile, TileKey, tile_cache
+from titiler_digitaltwin.prefetch import likely_tiles, prefetch_settings, prefetcher
 from titiler_digitaltwin.reader import DynamicDigitalTwinBackend, S2DigitalTwinReader
 
 from fastapi import Depends, Path, Query
 
+from starlette.background import BackgroundTask
 from starlette.requests import Request
 from starlette.responses import Response
 
@@ -82,6 +87,7 @@ class MosaicTilerFactory(BaseTilerFactory):
             **img_endpoint_params,
         )
         def tile(
+            request: Request,
             z: int = Path(..., ge=0, le=30, description="Mercator tiles's zoom level"),
             x: int = Path(..., description="Mercator tiles's column"),
             y: int = Path(..., description="Mercator tiles's row"),
@@ -105,49 +111,97 @@ class MosaicTilerFactory(BaseTilerFactory):
             """Create map tile from a COG."""
             tilesize = scale * 256
 
-            threads = int(os.getenv("MOSAIC_CONCURRENCY", MAX_THREADS))
-            with rasterio.Env(**self.gdal_config):
+            # We pass year/month/day here
+            # the Grid id will be dynamically defined withing mosaic backend's get_assets
+            reader_options = {
+                "year": src_path.year,
+                "month": src_path.month,
+                "day": src_path.day,
+            }
+
+            def render(x: int, y: int, z: int, threads: int) -> Tuple[bytes, str]:
+                with rasterio.Env(**self.gdal_config):
+                    with self.reader(
+                        reader=self.dataset_reader, reader_options=reader_options,
+                    ) as src_dst:
+                        data, _ = src_dst.tile(
+                            x,
+                            y,
+                            z,
+                            pixel_selection=pixel_selection.method(),
+                            threads=threads,
+                            tilesize=tilesize,
+                            # because the mosaic is dynamic, there migth be some time where the file just doesn't exist
+                            allowed_exceptions=(RasterioIOError, TileOutsideBounds,),
+                            **layer_params.kwargs,
+                            **dataset_params.kwargs,
+                            **kwargs,
+                        )
+
+                img_format = format
+                if not img_format:
+                    img_format = ImageType.jpeg if data.mask.all() else ImageType.png
+
+                image = data.post_process(
+                    in_range=render_params.rescale_range,
+                    color_formula=render_params.color_formula,
+                )
+
+                content = image.render(
+                    add_mask=render_params.return_mask,
+                    img_format=img_format.driver,
+                    colormap=colormap,
+                    **img_format.profile,
+                    **render_params.kwargs,
+                )
+
+                return content, img_format.mediatype
+
+            key = TileKey(
+                tms.identifier,
+                x,
+                y,
+                z,
+                scale,
+                format.value if format else None,
+                tuple(sorted(request.query_params.multi_items())),
+            )
+
+            def schedule_prefetch():
                 with self.reader(
-                    reader=self.dataset_reader,
-                    # We pass year/month/day here
-                    # the Grid id will be dynamically defined withing mosaic backend's get_assets
-                    reader_options={
-                        "year": src_path.year,
-                        "month": src_path.month,
-                        "day": src_path.day,
-                    },
+                    reader=self.dataset_reader, reader_options=reader_options
                 ) as src_dst:
-                    data, _ = src_dst.tile(
-                        x,
-                        y,
-                        z,
-                        pixel_selection=pixel_selection.method(),
-                        threads=threads,
-                        tilesize=tilesize,
-                        # because the mosaic is dynamic, there migth be some time where the file just doesn't exist
-                        allowed_exceptions=(RasterioIOError, TileOutsideBounds,),
-                        **layer_params.kwargs,
-                        **dataset_params.kwargs,
-                        **kwargs,
+                    next_tiles = likely_tiles(
+                        src_dst, x, y, z, prefetch_settings.max_tiles
                     )
 
-            if not format:
-                format = ImageType.jpeg if data.mask.all() else ImageType.png
+                for tx, ty, tz in next_tiles:
+                    prefetcher.schedule(
+                        key._replace(x=tx, y=ty, z=tz), partial(render, tx, ty, tz, 1)
+                    )
 
-            image = data.post_process(
-                in_range=render_params.rescale_range,
-                color_formula=render_params.color_formula,
+            # Prefetch is scheduled once the response has been sent,
+            # including for cached tiles so it follows the user across the map
+            background = (
+                BackgroundTask(schedule_prefetch) if prefetcher is not None else None
             )
 
-            content = image.render(
-                add_mask=render_params.return_mask,
-                img_format=format.driver,
-                colormap=colormap,
-                **format.profile,
-                **render_params.kwargs,
-            )
+            cached = tile_cache.get(key) if tile_cache is not None else None
+            if cached is not None:
+                if prefetcher is not None:
+                    prefetcher.consume(cached)
+                return Response(
+                    cached.content, media_type=cached.media_type, background=background
+                )
+
+            threads = int(os.getenv("MOSAIC_CONCURRENCY", MAX_THREADS))
+            with prefetcher.foreground() if prefetcher is not None else nullcontext():
+                content, media_type = render(x, y, z, threads)
+
+            if tile_cache is not None:
+                tile_cache.set(key, CachedTile(content, media_type))
 
-            return Response(content, media_type=format.mediatype)
+            return Response(content, media_type=media_type, background=background)
 
     def tilejson(self):  # noqa: C901
         """Add tilejson endpoint."""
@@ -0,0 +1,226 @@
+"""titiler-digitaltwin speculative tile prefetch."""
+
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import attr
+from cogeo_mosaic.backends import BaseBackend
+
+from titiler_digitaltwin.cache import CachedTile, LRUCache, tile_cache
+from titiler_digitaltwin.settings import PrefetchSettings
+
+logger = logging.getLogger(__name__)
+
+prefetch_settings = PrefetchSettings()
+
+
+def likely_tiles(
+    src_dst: BaseBackend, x: int, y: int, z: int, max_tiles: int = 8
+) -> List[Tuple[int, int, int]]:
+    """Tiles a map client is likely to request after `z/x/y`.
+
+    Candidates are, in order: the 4 edge neighbours, the 4 children at z+1 and the
+    4 diagonal neighbours. Tiles outside the TMS matrix, the mosaic zooms or
+    not intersecting the grid are skipped.
+
+    """
+    candidates = [
+        (x, y - 1, z),
+        (x + 1, y, z),
+        (x, y + 1, z),
+        (x - 1, y, z),
+    ]
+    candidates += [
+        (2 * x, 2 * y, z + 1),
+        (2 * x + 1, 2 * y, z + 1),
+        (2 * x, 2 * y + 1, z + 1),
+        (2 * x + 1, 2 * y + 1, z + 1),
+    ]
+    candidates += [
+        (x - 1, y - 1, z),
+        (x + 1, y - 1, z),
+        (x + 1, y + 1, z),
+        (x - 1, y + 1, z),
+    ]
+
+    tiles: List[Tuple[int, int, int]] = []
+    for tx, ty, tz in candidates:
+        if len(tiles) >= max_tiles:
+            break
+
+        if tz < src_dst.minzoom or tz > src_dst.maxzoom:
+            continue
+
+        matrix = src_dst.tms.matrix(tz)
+        if not (0 <= tx < matrix.matrixWidth and 0 <= ty < matrix.matrixHeight):
+            continue
+
+        if not src_dst.assets_for_tile(tx, ty, tz):
+            continue
+
+        tiles.append((tx, ty, tz))
+
+    return tiles
+
+
+@attr.s
+class Prefetcher:
+    """Background tile prefetcher.
+
+    Scheduled tiles are rendered by `concurrency` worker threads and written to
+    the tile cache. Workers only start a job when no foreground request is being
+    processed, and jobs are dropped when the queue (`queue_size`) is full or when
+    prefetched tiles not yet requested use more than `max_bytes` in the cache.
+
+    Note: the prefetcher sets the tile cache `on_evict` callback.
+
+    """
+
+    cache: LRUCache = attr.ib()
+    concurrency: int = attr.ib(default=1)
+    queue_size: int = attr.ib(default=16)
+    max_bytes: int = attr.ib(default=16 * 2 ** 20)
+
+    scheduled: int = attr.ib(init=False, default=0)
+    dropped: int = attr.ib(init=False, default=0)
+    completed: int = attr.ib(init=False, default=0)
+    failed: int = attr.ib(init=False, default=0)
+    hits: int = attr.ib(init=False, default=0)
+    prefetched_bytes: int = attr.ib(init=False, default=0)
+
+    def __attrs_post_init__(self):
+        """Create queue and synchronization primitives."""
+        self.cache.on_evict = self._evicted
+        self._queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self._pending: Set[Hashable] = set()
+        self._foreground = 0
+        self._idle = threading.Condition()
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+
+    def _start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for _ in range(self.concurrency):
+                worker = threading.Thread(target=self._work, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            key, render = self._queue.get()
+            try:
+                with self._idle:
+                    while self._foreground:
+                        self._idle.wait()
+
+                if key in self.cache:
+                    continue
+
+                if self.prefetched_bytes >= self.max_bytes:
+                    with self._lock:
+                        self.dropped += 1
+                    continue
+
+                content, media_type = render()
+                with self._lock:
+                    if self.prefetched_bytes + len(content) > min(
+                        self.max_bytes, self.cache.maxsize
+                    ):
+                        self.dropped += 1
+                        continue
+                    self.prefetched_bytes += len(content)
+                    self.completed += 1
+
+                self.cache.set(key, CachedTile(content, media_type, True))
+            except Exception:
+                logger.debug("prefetch failed for %s", key, exc_info=True)
+                with self._lock:
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+    @contextmanager
+    def foreground(self):
+        """Mark a foreground request as in progress, pausing the workers."""
+        with self._idle:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._foreground -= 1
+                if not self._foreground:
+                    self._idle.notify_all()
+
+    def schedule(self, key: Hashable, render: Callable[[], Tuple[bytes, str]]):
+        """Queue `render` for a tile, unless it is cached, pending or the queue is full."""
+        if key in self.cache:
+            return
+
+        with self._lock:
+            if key in self._pending:
+                return
+            try:
+                self._queue.put_nowait((key, render))
+            except queue.Full:
+                self.dropped += 1
+                return
+            self._pending.add(key)
+            self.scheduled += 1
+
+        self._start()
+
+    def _release(self, tile: CachedTile) -> bool:
+        with self._lock:
+            if not tile.prefetched:
+                return False
+            tile.prefetched = False
+            self.prefetched_bytes -= len(tile.content)
+            return True
+
+    def _evicted(self, key: Hashable, tile: CachedTile):
+        self._release(tile)
+
+    def consume(self, tile: CachedTile):
+        """Record a request served from the tile cache."""
+        if self._release(tile):
+            with self._lock:
+                self.hits += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Prefetch statistics."""
+        return {
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.completed if self.completed else None,
+            "bytes": self.prefetched_bytes,
+        }
+
+
+# On AWS Lambda the container is frozen once the response is sent, so background
+# renders would run during the next invocation instead of between requests.
+on_lambda = "AWS_LAMBDA_FUNCTION_NAME" in os.environ
+if prefetch_settings.enabled and on_lambda:
+    logger.warning("Tile prefetch is not supported on AWS Lambda and is disabled.")
+
+prefetcher: Optional[Prefetcher] = (
+    Prefetcher(
+        tile_cache,
+        concurrency=prefetch_settings.concurrency,
+        queue_size=prefetch_settings.queue_size,
+        max_bytes=prefetch_settings.max_bytes,
+    )
+    if prefetch_settings.enabled and tile_cache is not None and not on_lambda
+    else None
+)
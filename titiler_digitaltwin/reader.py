@@ -2,7 +2,7 @@
 
 import json
 import pathlib
-from typing import Dict, List, Tuple, Type
+from typing import Dict, List, Optional, Tuple, Type
 
 import attr
 from cogeo_mosaic.backends.base import BaseBackend
@@ -15,6 +15,8 @@ from rio_tiler.constants import WEB_MERCATOR_TMS
 from rio_tiler.errors import InvalidBandName
 from rio_tiler.io import BaseReader, COGReader, MultiBandReader
 
+from titiler_digitaltwin.cache import BlockCache, block_cache
+
 # Load the grid from local geojson
 with open(f"{str(pathlib.Path(__file__).parent)}/data/grid.geojson") as f:
     mgrs_grid = json.load(f)
@@ -49,6 +51,27 @@ def get_grid_bbox(name: str) -> Tuple[float, float, float, float]:
     return featureBounds(feat["geometry"])
 
 
+@attr.s
+class CachedCOGReader(COGReader):
+    """COGReader reading the file through a BlockCache.
+
+    Note: `cache` defaults to the application block cache; when both are unset
+        (cache disabled) this behaves exactly like COGReader.
+
+    """
+
+    cache: Optional[BlockCache] = attr.ib(default=None)
+
+    def __attrs_post_init__(self):
+        """Open the dataset through the block cache."""
+        cache = self.cache or block_cache
+        if cache is not None and not self.dataset:
+            # Raise RasterioIOError for missing files before handing over to rasterio
+            cache.size(self.filepath)
+            self.dataset = cache.open_dataset(self.filepath)
+        super().__attrs_post_init__()
+
+
 @attr.s
 class S2DigitalTwinReader(MultiBandReader):
     """Sentinel DigitalTwin Reader
@@ -59,7 +82,7 @@ class S2DigitalTwinReader(MultiBandReader):
     year: int = attr.ib()
     month: int = attr.ib()
     day: int = attr.ib()
-    reader: Type[COGReader] = attr.ib(default=COGReader)
+    reader: Type[COGReader] = attr.ib(default=CachedCOGReader)
 
     # Nodata seems to be missing (might be added in the second iteration)
     reader_options: Dict = attr.ib(default={"nodata": 0})
@@ -1,5 +1,7 @@
 """Titiler-digitaltwin API settings."""
 
+from typing import Optional
+
 import pydantic
 
 
@@ -15,3 +17,39 @@ class ApiSettings(pydantic.BaseSettings):
     def parse_cors_origin(cls, v):
         """Parse CORS origins."""
         return [origin.strip() for origin in v.split(",")]
+
+
+class CacheSettings(pydantic.BaseSettings):
+    """Application caches settings."""
+
+    # Byte-range cache under the COG readers (0 to disable, requires rasterio>=1.3)
+    block_cache_maxsize: int = 0
+    block_cache_blocksize: int = 2 ** 17
+    block_cache_spill_dir: Optional[str] = None
+    block_cache_spill_maxsize: int = 256 * 2 ** 20
+    # Seconds during which missing files are remembered
+    block_cache_missing_ttl: float = 60.0
+    # Read `s3://{bucket}/{key}` from `{root}/{bucket}/{key}` (local stand-in for S3)
+    block_cache_file_root: Optional[str] = None
+
+    # Rendered tiles cache (0 to disable)
+    tile_cache_maxsize: int = 0
+    # Seconds after which cached tiles expire
+    tile_cache_ttl: float = 300.0
+
+
+class PrefetchSettings(pydantic.BaseSettings):
+    """Tile prefetch settings."""
+
+    # Prefetched tiles are written to the tile cache (needs `TILE_CACHE_MAXSIZE`)
+    enabled: bool = False
+    concurrency: int = 1
+    queue_size: int = 16
+    max_tiles: int = 8
+    # Cache budget for prefetched tiles not yet requested
+    max_bytes: int = 16 * 2 ** 20
+
+    class Config:
+        """model config"""
+
+        env_prefix = "PREFETCH_"